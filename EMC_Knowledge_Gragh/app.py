@@ -1,8 +1,11 @@
 import streamlit as st
-from neo4j import GraphDatabase
+from neo4j import GraphDatabase, Query
 from pyvis.network import Network
 import streamlit.components.v1 as components
 import os
+import sys
+import json
+from array import array
 
 # ================= 1. 页面配置 =================
 st.set_page_config(
@@ -26,6 +29,68 @@ def init_driver(uri, username, password):
     except Exception:
         return None
 
+class CompactGraph:
+    """查询结果的紧凑内存表示：节点用整数句柄，标签/关系类型/名称字符串驻留，边为数组列。"""
+
+    __slots__ = (
+        "vis_ids", "names", "labels", "node_ids", "entity_types", "core_attrs",
+        "edge_src", "edge_dst", "edge_types", "edge_descs", "_index", "_edge_keys",
+    )
+
+    def __init__(self):
+        self.vis_ids = []
+        self.names = []
+        self.labels = []
+        self.node_ids = []
+        self.entity_types = []
+        self.core_attrs = []
+        self.edge_src = array("i")
+        self.edge_dst = array("i")
+        self.edge_types = []
+        self.edge_descs = []
+        self._index = {}
+        self._edge_keys = set()
+
+    def __len__(self):
+        return len(self.vis_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.edge_src)
+
+    def add_node(self, n):
+        vis_id = n.get("id") or n.element_id
+        h = self._index.get(vis_id)
+        if h is not None:
+            return h
+        h = len(self.vis_ids)
+        self._index[vis_id] = h
+        self.vis_ids.append(vis_id)
+        self.names.append(sys.intern(str(n.get("name", "N/A"))))
+        self.labels.append(sys.intern(next(iter(n.labels), "Concept")))
+        self.node_ids.append(n.get("id", ""))
+        self.entity_types.append(sys.intern(str(n.get("entity_type", ""))))
+        self.core_attrs.append(n.get("core_attr", ""))
+        return h
+
+    def add_edge(self, src_h, dst_h, rel, dedup=False):
+        if dedup:
+            if rel.element_id in self._edge_keys:
+                return
+            self._edge_keys.add(rel.element_id)
+        self.edge_src.append(src_h)
+        self.edge_dst.append(dst_h)
+        self.edge_types.append(sys.intern(rel.type))
+        try:
+            self.edge_descs.append(rel.get("description", ""))
+        except Exception:
+            self.edge_descs.append("")
+
+    def add_record(self, n, r, m, dedup=False):
+        s_h = self.add_node(n)
+        if r is not None and m is not None:
+            self.add_edge(s_h, self.add_node(m), r, dedup)
+
 def get_data(driver, query_str, limit=50):
     cql = """
     MATCH (n) 
@@ -33,12 +98,14 @@ def get_data(driver, query_str, limit=50):
     OPTIONAL MATCH (n)-[r]-(m)
     RETURN n, r, m LIMIT $limit
     """
+    graph = CompactGraph()
     try:
         with driver.session() as session:
-            result = session.run(cql, name=query_str, limit=limit)
-            return [record for record in result]
+            for record in session.run(cql, name=query_str, limit=limit):
+                graph.add_record(record["n"], record["r"], record["m"])
+            return graph
     except Exception:
-        return []
+        return CompactGraph()
 
 def get_full_data(driver, limit=300):
     cql = """
@@ -46,12 +113,14 @@ def get_full_data(driver, limit=300):
     OPTIONAL MATCH (n)-[r]->(m) 
     RETURN n, r, m LIMIT $limit
     """
+    graph = CompactGraph()
     try:
         with driver.session() as session:
-            result = session.run(cql, limit=limit)
-            return [record for record in result]
+            for record in session.run(cql, limit=limit):
+                graph.add_record(record["n"], record["r"], record["m"])
+            return graph
     except Exception:
-        return []
+        return CompactGraph()
 
 def get_shortest_path(driver, start_name, end_name):
     cql = """
@@ -59,17 +128,96 @@ def get_shortest_path(driver, start_name, end_name):
     path = shortestPath((p1)-[*]-(p2))
     RETURN path
     """
+    graph = CompactGraph()
     try:
         with driver.session() as session:
             result = session.run(cql, start=start_name, end=end_name)
-            paths = [record["path"] for record in result]
-            data = []
-            for p in paths:
-                for rel in p.relationships:
-                    data.append({"n": rel.start_node, "r": rel, "m": rel.end_node})
-            return data
+            for record in result:
+                for rel in record["path"].relationships:
+                    graph.add_record(rel.start_node, rel, rel.end_node)
+            return graph
     except Exception:
-        return []
+        return CompactGraph()
+
+def split_terms(text):
+    for sep in ("，", "、", ";", "；"):
+        text = text.replace(sep, ",")
+    return [t.strip() for t in text.split(",") if t.strip()]
+
+MAX_BATCH_PAIRS = 400
+BATCH_QUERY_TIMEOUT = 30
+
+def _match_endpoints(session, terms, by_label, max_endpoints):
+    cql = """
+    UNWIND $terms AS k
+    MATCH (x) WHERE (CASE WHEN $by_label THEN k IN labels(x) ELSE x.name CONTAINS k END)
+    WITH DISTINCT x
+    ORDER BY x.name, elementId(x)
+    WITH collect(elementId(x)) AS ids
+    RETURN size(ids) AS total, ids[..$max_endpoints] AS ids
+    """
+    record = session.run(
+        Query(cql, timeout=BATCH_QUERY_TIMEOUT),
+        terms=terms,
+        by_label=by_label,
+        max_endpoints=max_endpoints
+    ).single()
+    return record["ids"], record["total"]
+
+def get_batch_paths(driver, start_terms, end_terms, by_label=False, max_hops=6, max_endpoints=20):
+    """计算起点集合到终点集合的全部两两最短路径，返回去重后的子图、逐对统计、两侧匹配数 (截取数, 总数)
+    以及不在任何已找到路径上的端点句柄。"""
+    cql = """
+    UNWIND $starts AS sid
+    MATCH (s) WHERE elementId(s) = sid
+    UNWIND $ends AS tid
+    MATCH (t) WHERE elementId(t) = tid
+    WITH s, t WHERE s <> t
+    OPTIONAL MATCH path = shortestPath((s)-[*..%d]-(t))
+    RETURN s, t, path
+    """ % int(max_hops)
+    graph = CompactGraph()
+    stats = []
+    counts = {}
+    endpoints = set()
+    on_path = set()
+    try:
+        with driver.session() as session:
+            starts, start_total = _match_endpoints(session, start_terms, by_label, int(max_endpoints))
+            ends, end_total = _match_endpoints(session, end_terms, by_label, int(max_endpoints))
+            counts = {"起点": (len(starts), start_total), "终点": (len(ends), end_total)}
+
+            if len(starts) * len(ends) > MAX_BATCH_PAIRS:
+                st.error(
+                    f"起终点组合数 {len(starts)}×{len(ends)} 超过上限 {MAX_BATCH_PAIRS}，"
+                    "请缩小关键词范围或减少每侧最大节点数。"
+                )
+                return CompactGraph(), [], counts, set()
+
+            result = session.run(Query(cql, timeout=BATCH_QUERY_TIMEOUT), starts=starts, ends=ends)
+            for record in result:
+                path = record["path"]
+                s_h = graph.add_node(record["s"])
+                t_h = graph.add_node(record["t"])
+                endpoints.update((s_h, t_h))
+                stats.append({
+                    "起点": graph.names[s_h],
+                    "起点ID": graph.vis_ids[s_h],
+                    "终点": graph.names[t_h],
+                    "终点ID": graph.vis_ids[t_h],
+                    "跳数": len(path) if path is not None else None
+                })
+                if path is None:
+                    continue
+                for rel in path.relationships:
+                    a_h = graph.add_node(rel.start_node)
+                    b_h = graph.add_node(rel.end_node)
+                    graph.add_edge(a_h, b_h, rel, dedup=True)
+                    on_path.update((a_h, b_h))
+            return graph, stats, counts, endpoints - on_path
+    except Exception as e:
+        st.error(f"批量路径查询失败：{e}")
+        return CompactGraph(), [], counts, set()
 
 # ================= 3. HTML 注入：hover/click 弹窗 + 拖拽/固定 + 全屏按钮 =================
 def inject_hover_click_popup(html_str: str) -> str:
@@ -489,13 +637,134 @@ def inject_hover_click_popup(html_str: str) -> str:
         return html_str.replace("</body>", injected + "\n</body>")
     return html_str + injected
 
-def write_graph_html(net: Network, out_path: str):
-    net.save_graph(out_path)
-    with open(out_path, "r", encoding="utf-8") as f:
-        html = f.read()
-    html = inject_hover_click_popup(html)
+# 与 pyvis 模板 tojson 过滤器一致的 HTML 安全转义
+_JSON_ESCAPES = str.maketrans({"<": "\\u003c", ">": "\\u003e", "&": "\\u0026", "'": "\\u0027"})
+
+def _to_js(obj):
+    return json.dumps(obj, ensure_ascii=False).translate(_JSON_ESCAPES)
+
+UNREACHED_NODE_STYLE = {
+    "color": {"background": "#F3F4F6", "border": "#9CA3AF"},
+    "size": 14,
+    "shapeProperties": {"borderDashes": [4, 4]},
+    "borderWidth": 2
+}
+
+def iter_vis_nodes(graph: CompactGraph, color_map: dict, font_color: str, muted=frozenset()):
+    for h in range(len(graph)):
+        if h in muted:
+            yield {
+                "id": graph.vis_ids[h],
+                "label": graph.names[h] or graph.vis_ids[h],
+                "title": graph.names[h],
+                "shape": "dot",
+                **UNREACHED_NODE_STYLE,
+                "font": {"color": "#6B7280"},
+                "node_id": graph.node_ids[h],
+                "neo_label": graph.labels[h],
+                "entity_type": graph.entity_types[h],
+                "core_attr": graph.core_attrs[h]
+            }
+            continue
+        yield {
+            "id": graph.vis_ids[h],
+            "label": graph.names[h] or graph.vis_ids[h],
+            "title": graph.names[h],
+            "shape": "dot",
+            "color": color_map.get(graph.labels[h], "#97C2FC"),
+            "size": 20,
+            "font": {"color": font_color},
+            "node_id": graph.node_ids[h],
+            "neo_label": graph.labels[h],
+            "entity_type": graph.entity_types[h],
+            "core_attr": graph.core_attrs[h]
+        }
+
+def iter_vis_edges(graph: CompactGraph):
+    # 与 pyvis 无向图 add_edge 一致：同一对节点之间只保留第一条边
+    seen = set()
+    for i in range(graph.edge_count):
+        s_h, t_h = graph.edge_src[i], graph.edge_dst[i]
+        pair = (s_h, t_h) if s_h <= t_h else (t_h, s_h)
+        if pair in seen:
+            continue
+        seen.add(pair)
+        yield {
+            "id": f"e_{i}",
+            "from": graph.vis_ids[s_h],
+            "to": graph.vis_ids[t_h],
+            "title": graph.edge_types[i],
+            "label": graph.edge_types[i],
+            "arrows": "to",
+            "rel_type": graph.edge_types[i],
+            "description": graph.edge_descs[i]
+        }
+
+class _VisData:
+    """已序列化的 vis.js 数组；len() 返回元素个数，供模板判断是否显示加载进度条。"""
+
+    __slots__ = ("json", "count")
+
+    def __init__(self, items):
+        self.count = 0
+        parts = []
+        for item in items:
+            parts.append(_to_js(item))
+            self.count += 1
+        self.json = "[" + ",".join(parts) + "]"
+
+    def __len__(self):
+        return self.count
+
+def _dumps_vis(obj, **kwargs):
+    if isinstance(obj, _VisData):
+        return obj.json
+    return json.dumps(obj, **kwargs)
+
+def render_graph_html(net: Network, graph: CompactGraph, color_map: dict, muted=frozenset()) -> str:
+    # 直接渲染 pyvis 的 Jinja 模板：节点/边由列数据逐条序列化，不经过 add_node/add_edge
+    try:
+        env = net.templateEnv
+        template = env.get_template(net.path)
+        _, _, heading, height, width, options = net.get_network_data()
+    except AttributeError:
+        # pyvis 内部接口变化时退回常规路径
+        net.nodes = list(iter_vis_nodes(graph, color_map, net.font_color, muted))
+        net.edges = list(iter_vis_edges(graph))
+        return net.generate_html()
+
+    if isinstance(net.options, dict):
+        physics_enabled = net.options.get("physics", {}).get("enabled", True)
+    else:
+        physics_enabled = net.options.physics.enabled
+
+    env.policies["json.dumps_function"] = _dumps_vis
+    return template.render(
+        height=height,
+        width=width,
+        nodes=_VisData(iter_vis_nodes(graph, color_map, net.font_color, muted)),
+        edges=_VisData(iter_vis_edges(graph)),
+        heading=heading,
+        options=options,
+        physics_enabled=physics_enabled,
+        use_DOT=net.use_DOT,
+        dot_lang=net.dot_lang,
+        widget=net.widget,
+        bgcolor=net.bgcolor,
+        conf=net.conf,
+        tooltip_link=any("href" in name for name in graph.names),
+        neighborhood_highlight=net.neighborhood_highlight,
+        select_menu=net.select_menu,
+        filter_menu=net.filter_menu,
+        notebook=False,
+        cdn_resources=net.cdn_resources
+    )
+
+def write_graph_html(net: Network, graph: CompactGraph, color_map: dict, out_path: str, muted=frozenset()) -> str:
+    html = inject_hover_click_popup(render_graph_html(net, graph, color_map, muted))
     with open(out_path, "w", encoding="utf-8") as f:
         f.write(html)
+    return html
 
 # ================= 4. 侧边栏 =================
 with st.sidebar:
@@ -516,11 +785,13 @@ with st.sidebar:
     st.markdown("---")
 
     # ✅ 修改 2：路径分析 -> 显示节点关联路径
-    mode = st.radio("功能模式", ["显示相关节点", "显示节点关联路径"])
+    mode = st.radio("功能模式", ["显示相关节点", "显示节点关联路径", "批量路径分析"])
 
     search_query = ""
     path_start = ""
     path_end = ""
+    batch_starts = []
+    batch_ends = []
 
     # ✅ 默认开启物理引力，不再提供开关
     use_physics = True
@@ -540,6 +811,26 @@ with st.sidebar:
             step=50
         )
 
+    elif mode == "批量路径分析":
+        match_by = st.radio("匹配方式", ["关键词", "标签"], horizontal=True)
+        batch_starts = split_terms(st.text_input("起点集合（逗号分隔）", "电源"))
+        batch_ends = split_terms(st.text_input("终点集合（逗号分隔）", "干扰"))
+        max_hops = st.number_input(
+            "最大跳数",
+            min_value=1,
+            max_value=15,
+            value=6,
+            step=1
+        )
+        node_limit = st.number_input(
+            "每侧最大节点数",
+            min_value=1,
+            max_value=50,
+            value=20,
+            step=5,
+            help=f"按名称排序截取；起终点组合数不超过 {MAX_BATCH_PAIRS}"
+        )
+
     else:
         c1, c2 = st.columns(2)
         path_start = c1.text_input("起点", "电源")
@@ -563,7 +854,10 @@ if st.session_state.message:
     st.session_state.message = None
     st.session_state.msg_type = None
 
-data = []
+data = CompactGraph()
+path_stats = []
+endpoint_counts = {}
+unreached = set()
 if mode == "显示相关节点":
     if show_all_graph:
         data = get_full_data(driver, limit=int(node_limit))
@@ -571,6 +865,41 @@ if mode == "显示相关节点":
         data = get_data(driver, search_query, int(node_limit))
 elif mode == "显示节点关联路径" and path_start and path_end:
     data = get_shortest_path(driver, path_start, path_end)
+elif mode == "批量路径分析" and batch_starts and batch_ends:
+    data, path_stats, endpoint_counts, unreached = get_batch_paths(
+        driver,
+        batch_starts,
+        batch_ends,
+        by_label=(match_by == "标签"),
+        max_hops=int(max_hops),
+        max_endpoints=int(node_limit)
+    )
+
+truncated = [
+    f"{side}匹配 {total} 个，仅使用前 {used} 个"
+    for side, (used, total) in endpoint_counts.items() if used < total
+]
+if truncated:
+    st.warning("端点数超过每侧最大节点数（按名称排序截取）：" + "；".join(truncated))
+
+unmatched = [side for side, (_, total) in endpoint_counts.items() if total == 0]
+if unmatched:
+    by = "标签" if match_by == "标签" else "关键词"
+    st.warning(f"{'、'.join(unmatched)}集合按{by}未匹配到任何节点，请检查输入。")
+
+if path_stats:
+    found = sum(1 for row in path_stats if row["跳数"] is not None)
+    if found == 0:
+        st.warning(f"{len(path_stats)} 对起终点在 {int(max_hops)} 跳内均无路径，图中仅显示端点。")
+    caption = (
+        f"共 {len(path_stats)} 对起终点，{found} 对存在路径；"
+        f"路径子图含 {len(data) - len(unreached)} 个节点、{data.edge_count} 条关系。"
+    )
+    if unreached:
+        caption += f" 另有 {len(unreached)} 个端点在 {int(max_hops)} 跳内无路径（灰色虚线显示）。"
+    st.caption(caption)
+    with st.expander("逐对路径统计", expanded=False):
+        st.dataframe(path_stats, use_container_width=True)
 
 if data:
     net = Network(height="900px", width="100%", bgcolor="#ffffff", font_color="black", notebook=False)
@@ -593,88 +922,13 @@ if data:
         "Concept": "#C7C7C7"
     }
 
-    node_ids = set()
-    edge_counter = 0
-
-    def node_vis_id(n):
-        return n.get("id") if n.get("id") else n.element_id
-
-    def node_label(n):
-        return list(n.labels)[0] if n.labels else "Concept"
-
-    for record in data:
-        src = record["n"]
-        s_vis_id = node_vis_id(src)
-        s_name = src.get("name", "N/A")
-        s_label = node_label(src)
-
-        if s_vis_id not in node_ids:
-            net.add_node(
-                s_vis_id,
-                label=s_name,
-                title=s_name,
-                color=color_map.get(s_label, "#97C2FC"),
-                size=20,
-                font={"size": 14},
-                node_id=src.get("id", ""),
-                neo_label=s_label,
-                entity_type=src.get("entity_type", ""),
-                core_attr=src.get("core_attr", "")
-            )
-            node_ids.add(s_vis_id)
-
-        tgt = record.get("m")
-        rel = record.get("r")
-
-        if tgt is not None and rel is not None:
-            t_vis_id = node_vis_id(tgt)
-            t_name = tgt.get("name", "N/A")
-            t_label = node_label(tgt)
-
-            if t_vis_id not in node_ids:
-                net.add_node(
-                    t_vis_id,
-                    label=t_name,
-                    title=t_name,
-                    color=color_map.get(t_label, "#97C2FC"),
-                    size=20,
-                    font={"size": 14},
-                    node_id=tgt.get("id", ""),
-                    neo_label=t_label,
-                    entity_type=tgt.get("entity_type", ""),
-                    core_attr=tgt.get("core_attr", "")
-                )
-                node_ids.add(t_vis_id)
-
-            rel_type = rel.type
-            try:
-                rel_desc = rel.get("description", "")
-            except Exception:
-                rel_desc = ""
-
-            edge_id = f"e_{edge_counter}"
-            edge_counter += 1
-
-            net.add_edge(
-                s_vis_id,
-                t_vis_id,
-                id=edge_id,
-                title=rel_type,
-                label=rel_type,
-                arrows="to",
-                rel_type=rel_type,
-                description=rel_desc
-            )
-
     net.toggle_physics(use_physics)
 
     out_dir = "html_files"
     os.makedirs(out_dir, exist_ok=True)
     out_html = os.path.join(out_dir, "graph.html")
 
-    write_graph_html(net, out_html)
-
-    with open(out_html, "r", encoding="utf-8") as f:
-        components.html(f.read(), height=980, scrolling=False)
+    html = write_graph_html(net, data, color_map, out_html, muted=unreached)
+    components.html(html, height=980, scrolling=False)
 else:
     st.info("暂无数据，请调整搜索条件。")